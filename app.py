@@ -1,12 +1,40 @@
 import streamlit as st
-import pandas as pd
+import polars as pl
+import numpy as np
+import asyncio
 import glob
 import os
-import plotly.express as px
+import uuid
+import plotly.graph_objects as go
+from plotly_resampler import FigureResampler
 from graph.workflow import create_workflow
 
 st.set_page_config(page_title="Air Quality Insight & Alert Agent", layout="wide")
 
+@st.cache_data(show_spinner=False)
+def load_dataset(path, mtime):
+    # Cached on (path, mtime); on a cache miss re-encode the CSV as Parquet
+    # so later cold loads parse the columnar file instead of the CSV
+    pq = path + ".parquet"
+    if os.path.exists(pq) and os.path.getmtime(pq) >= mtime:
+        return pl.read_parquet(pq)
+    # Multi-threaded CSV parse; the station files use "NA" for missing values
+    df = pl.read_csv(path, try_parse_dates=True, null_values=["NA"])
+    df.write_parquet(pq)
+    return df
+
+@st.cache_resource
+def get_graph():
+    # Compile the StateGraph once and share it across sessions; the
+    # MemorySaver checkpointer keys runs by thread_id, so per-session
+    # state stays isolated
+    return create_workflow()
+
+async def run_graph(graph_app, state, config):
+    # Drain the async stream; node updates land in the checkpointer
+    async for event in graph_app.astream(state, config):
+        pass
+
 st.title("🌫️ Air Quality Insight & Alert Agent")
 st.markdown("""
 Monitor, analyze, and detect anomalies in air quality data using **LangGraph** & **Ollama**.
@@ -19,23 +47,26 @@ selected_file = st.sidebar.selectbox("Select Dataset", data_files)
 anomaly_threshold = st.sidebar.slider("Anomaly Alert Threshold (%)", 0.0, 5.0, 1.0) / 100
 
 # Initialize session state for workflow
-if "graph_app" not in st.session_state:
-    st.session_state.graph_app = create_workflow()
+st.session_state.graph_app = get_graph()
 if "thread_id" not in st.session_state:
-    st.session_state.thread_id = "1"
+    # Unique per session: the shared graph's checkpointer keys state by
+    # thread_id, so a fixed id would let sessions clobber each other
+    st.session_state.thread_id = str(uuid.uuid4())
 if "current_result" not in st.session_state:
     st.session_state.current_result = None
 
 if selected_file:
-    df = pd.read_csv(selected_file)
+    df = load_dataset(selected_file, os.path.getmtime(selected_file))
     st.sidebar.info(f"Loaded {len(df)} records.")
 
     if st.sidebar.button("Run New Analysis"):
         st.session_state.current_result = None
         # Start fresh run
         initial_state = {
-            "data": df.to_dict('records'), # Convert to serializable format
-            "anomalies": [],
+            "pm25": df["PM2.5 (µg/m³)"].to_numpy(),
+            "pm10": df["PM10 (µg/m³)"].to_numpy(),
+            "timestamps": df["Timestamp"].to_numpy(),
+            "anomalies": np.empty(0, dtype="datetime64[ns]"),
             "anomaly_threshold": anomaly_threshold,
             "air_quality_class": "Unknown",
             "trend_summary": {},
@@ -51,9 +82,8 @@ if selected_file:
         
         with st.spinner("Agent initializing..."):
             # This will run until the interrupt before alert_decision
-            for event in st.session_state.graph_app.stream(initial_state, config):
-                pass
-            
+            asyncio.run(run_graph(st.session_state.graph_app, initial_state, config))
+
             st.session_state.current_result = st.session_state.graph_app.get_state(config).values
 
     # Handle Human-in-the-loop if interrupted
@@ -67,19 +97,19 @@ if selected_file:
             if col_app.button("✅ Approve & Continue"):
                 with st.spinner("Agent resuming..."):
                     # Resume execution
-                    for event in st.session_state.graph_app.stream(None, config):
-                        pass
+                    asyncio.run(run_graph(st.session_state.graph_app, None, config))
                     st.session_state.current_result = st.session_state.graph_app.get_state(config).values
                     st.rerun()
 
     if st.session_state.current_result:
         result = st.session_state.current_result
-        # Convert data back to DataFrame for plotting
-        plot_df = pd.DataFrame(result["data"])
-        if "Timestamp" in plot_df.columns:
-            plot_df["Timestamp"] = pd.to_datetime(plot_df["Timestamp"])
-            plot_df.set_index("Timestamp", inplace=True)
-        
+        # Plot straight from the validated arrays in graph state — the
+        # timestamps were parsed once in validate_readings
+        ts = result["timestamps"]
+        pm25 = result["pm25"]
+        pm10 = result["pm10"]
+
+
         # Display Results
         st.divider()
         
@@ -87,18 +117,18 @@ if selected_file:
         
         with col1:
             st.subheader("📈 Air Quality Trends")
-            fig = px.line(plot_df, x=plot_df.index, y=["PM2.5 (µg/m³)", "PM10 (µg/m³)"], 
-                         title="PM2.5 and PM10 Time-Series")
-            # Highlight anomalies
-            if result["anomalies"]:
-                # Result anomalies are strings (Timestamps), convert back for indexing
-                anomaly_indices = pd.to_datetime(result["anomalies"]) if "Timestamp" in plot_df.index.dtype.name or True else result["anomalies"]
-                try:
-                    anomaly_df = plot_df.loc[anomaly_indices]
-                    fig.add_scatter(x=anomaly_df.index, y=anomaly_df["PM2.5 (µg/m³)"], 
-                                   mode='markers', name='Anomalies', marker=dict(color='red', size=8))
-                except Exception as e:
-                    st.error(f"Error plotting anomalies: {e}")
+            # Downsample to ~1000 points per trace so render cost stays flat
+            # regardless of dataset size; Scattergl renders via WebGL
+            fig = FigureResampler(go.Figure(), default_n_shown_samples=1000)
+            fig.add_trace(go.Scattergl(name="PM2.5 (µg/m³)"), hf_x=ts, hf_y=pm25)
+            fig.add_trace(go.Scattergl(name="PM10 (µg/m³)"), hf_x=ts, hf_y=pm10)
+            fig.update_layout(title="PM2.5 and PM10 Time-Series")
+            # Highlight anomalies (already sparse, so no resampling needed)
+            if result["anomalies"].size:
+                # Anomalies are already datetime64, so masking is one C call
+                anomaly_mask = np.isin(ts, result["anomalies"])
+                fig.add_trace(go.Scattergl(x=ts[anomaly_mask], y=pm25[anomaly_mask],
+                                           mode='markers', name='Anomalies', marker=dict(color='red', size=8)))
             st.plotly_chart(fig, use_container_width=True)
             
         with col2:
@@ -0,0 +1,36 @@
+import numpy as np
+from numba import njit
+
+# Fused numerical kernel for the hot path. Everything the analysis nodes
+# need from the raw readings (global mean/std/min/max, PM10 mean, daily
+# averages) comes out of one compiled loop instead of ~6 separate array
+# passes. First call pays the JIT compile; cache=True amortizes it across
+# processes.
+
+@njit(cache=True, fastmath=True)
+def fused_stats(pm25, pm10, day_idx, n_days):
+    n = pm25.size
+    s = 0.0
+    s2 = 0.0
+    s10 = 0.0
+    mn = np.float64(pm25[0])
+    mx = np.float64(pm25[0])
+    day_sums = np.zeros(n_days, dtype=np.float64)
+    day_counts = np.zeros(n_days, dtype=np.int64)
+
+    for i in range(n):
+        v = np.float64(pm25[i])
+        s += v
+        s2 += v * v
+        if v < mn:
+            mn = v
+        if v > mx:
+            mx = v
+        s10 += np.float64(pm10[i])
+        d = day_idx[i]
+        day_sums[d] += v
+        day_counts[d] += 1
+
+    mean = s / n
+    std = np.sqrt(s2 / n - mean * mean)
+    return mean, std, mn, mx, s10 / n, day_sums / day_counts
@@ -1,11 +1,24 @@
-from typing import TypedDict, List, Annotated
-import pandas as pd
+from typing import TypedDict, List
+import numpy as np
 
 class AgentState(TypedDict):
-    # The raw data (Will be stored as serializable list of dicts)
-    data: List[dict]
-    # List of indices where anomalies were detected
-    anomalies: List[int]
+    # Validated PM2.5 readings (float array, one entry per reading)
+    pm25: np.ndarray
+    # Validated PM10 readings (float array, one entry per reading)
+    pm10: np.ndarray
+    # Parsed reading timestamps (datetime64[ns], aligned with pm25/pm10)
+    timestamps: np.ndarray
+    # PM2.5 statistics from the fused validation kernel
+    pm25_mean: float
+    pm25_std: float
+    pm25_min: float
+    pm25_max: float
+    # PM10 mean from the fused validation kernel
+    pm10_mean: float
+    # Daily PM2.5 averages (one entry per calendar day, in order)
+    daily_avg: np.ndarray
+    # Timestamps where anomalies were detected (datetime64[ns])
+    anomalies: np.ndarray
     # Threshold for triggering alerts (percentage of anomalies)
     anomaly_threshold: float
     # Classification result (e.g., "Good", "Hazardous")
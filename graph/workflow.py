@@ -1,9 +1,11 @@
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
 from .state import AgentState
 from .nodes import (
     validate_readings,
     detect_anomalies,
+    join_analysis,
     alert_decision,
     classify_air_quality,
     generate_trend_summary,
@@ -18,20 +20,27 @@ def create_workflow():
     workflow.add_node("validate_readings", validate_readings)
     workflow.add_node("detect_anomalies", detect_anomalies)
     workflow.add_node("classify_air_quality", classify_air_quality)
-    workflow.add_node("alert_decision", alert_decision)
     workflow.add_node("generate_trend_summary", generate_trend_summary)
+    workflow.add_node("join_analysis", join_analysis)
+    workflow.add_node("alert_decision", alert_decision)
     workflow.add_node("nl_summary", nl_summary)
     workflow.add_node("critique_summary", critique_summary)
 
     # Set entry point
     workflow.set_entry_point("validate_readings")
 
-    # Connect nodes
+    # Fan out: the three analysis nodes read the validated arrays and write
+    # independent state keys, so LangGraph runs them concurrently
     workflow.add_edge("validate_readings", "detect_anomalies")
-    workflow.add_edge("detect_anomalies", "classify_air_quality")
-    workflow.add_edge("classify_air_quality", "alert_decision")
-    workflow.add_edge("alert_decision", "generate_trend_summary")
-    workflow.add_edge("generate_trend_summary", "nl_summary")
+    workflow.add_edge("validate_readings", "classify_air_quality")
+    workflow.add_edge("validate_readings", "generate_trend_summary")
+
+    # Fan in before deciding on the alert and summarizing
+    workflow.add_edge("detect_anomalies", "join_analysis")
+    workflow.add_edge("classify_air_quality", "join_analysis")
+    workflow.add_edge("generate_trend_summary", "join_analysis")
+    workflow.add_edge("join_analysis", "alert_decision")
+    workflow.add_edge("alert_decision", "nl_summary")
     workflow.add_edge("nl_summary", "critique_summary")
 
     # Conditional cycle for self-correction
@@ -49,8 +58,9 @@ def create_workflow():
         }
     )
 
-    # Set up memory
-    memory = MemorySaver()
+    # Set up memory; the default serializer can't msgpack the NumPy arrays
+    # the state carries, so fall back to pickling them
+    memory = MemorySaver(serde=JsonPlusSerializer(pickle_fallback=True))
 
     # Compile with persistence and interrupt
     # We interrupt before 'alert_decision' to wait for human approval if needed